@@ -3,32 +3,136 @@ CryptoPulse.AI v4.5 — Scheduled, Bluesky, LinkedIn, Substack, Tweets, Shorts s
 Author: Manuel (omcdigest.bsky.social)
 """
 
+import io
 import os
 import re
+import sys
+import json
+import base64
+import time
+import difflib
+import hashlib
+import sqlite3
+import unicodedata
+import orjson
 import requests
-import feedparser
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from dotenv import load_dotenv
 
 # === CONFIG ===============================================================================
-load_dotenv()
+# Só importa o python-dotenv se houver mesmo um .env (no GitHub Actions vem tudo dos secrets)
+ENV_FILE = Path(__file__).resolve().with_name(".env")
+if ENV_FILE.exists():
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 CRYPTOPANIC_TOKEN = os.getenv("CRYPTOPANIC_TOKEN", "")
 BLUESKY_HANDLE = os.getenv("BLUESKY_HANDLE", "")
 BLUESKY_PASSWORD = os.getenv("BLUESKY_PASSWORD", "")
 DRY_RUN = os.getenv("DRY_RUN", "0") == "1"
-
-OUT_DIR = "out"
-os.makedirs(OUT_DIR, exist_ok=True)
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")            # textos longos
+OPENAI_FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", "gpt-4.1-nano")  # tweets e shorts
+FORCE_REFRESH = os.getenv("FORCE_REFRESH", "0") == "1"
+BATCH_MODE = os.getenv("BATCH_MODE", "0") == "1"
+COMBINED_PROMPT = os.getenv("COMBINED_PROMPT", "0") == "1"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))  # segundos
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_THRESHOLD = float(os.getenv("SEMANTIC_THRESHOLD", "0.92"))
+
+OUT = Path("out")
+OUT.mkdir(exist_ok=True)
+LLM_CACHE_PATH = OUT / ".llm_cache.sqlite"
+BATCH_STATE_PATH = OUT / "batch_id.txt"
+LAST_HEADLINES_PATH = OUT / ".last_headlines_hash"
+BLUESKY_POSTED_PATH = OUT / ".bluesky_posted"  # hashes dos últimos posts publicados
+NEWS_CACHE_TTL = 600  # o feed "hot" muda em minutos, não em segundos
+
+
+class _Retry(Retry):
+    """Retry para o Bluesky: POST só se repete em 429 (e falhas de ligação).
+
+    Um createRecord que deu timeout de leitura ou 5xx pode já ter sido publicado —
+    repeti-lo duplicava o post.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() == "POST":
+            return status_code == 429
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+# backoff exponencial + jitter em 429/5xx, respeitando o Retry-After dos rate limits
+RETRY_OPTS = dict(
+    total=5,
+    backoff_factor=0.6,
+    backoff_max=30,
+    backoff_jitter=1.0,
+    status_forcelist=[429, 500, 502, 503, 504],
+    respect_retry_after_header=True,
+)
+
+# Uma única sessão HTTP para tudo: reaproveita ligações TCP/TLS (keep-alive)
+# e repete automaticamente em 429/5xx/timeouts (OpenAI, CryptoPanic, Google News).
+# O requests já pede br (Brotli) sozinho quando o pacote brotli está instalado.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(**RETRY_OPTS, allowed_methods=["GET", "POST"]),
+))
+# Bluesky à parte: os posts não são idempotentes, por isso timeouts de leitura só em GET
+SESSION.mount("https://bsky.social", HTTPAdapter(
+    max_retries=_Retry(**RETRY_OPTS, allowed_methods=["GET"]),
+))
 
 
 # === HELPERS =============================================================================
+@dataclass(slots=True)
+class Headline:
+    """Uma notícia: título limpo e fonte (vazia no fallback do Google News)."""
+    title: str
+    source: str = ""
+
+    def __str__(self):
+        # formato usado nos prompts: "Bitcoin pumps after ETF approval (CoinDesk)"
+        return f"{self.title} ({self.source})" if self.source else self.title
+
+
+def format_headlines(news_items):
+    return "\n".join(map(str, news_items))
+
+
+_URL_RE = re.compile(r"http\S+|www\.\S+")
+_KEY_RE = re.compile(r"[^a-z0-9]+")  # tudo o que não conta para comparar títulos
+# substituições de um só carácter (travessões, aspas curvas), feitas numa única passagem
+_CLEAN_TRANS = str.maketrans({"—": "-", "–": "-", "“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
 def clean_text(text):
     """Remove URLs e lixo visual para posts curtos."""
-    text = re.sub(r"http\S+", "", text)
-    text = re.sub(r"www\.\S+", "", text)
-    text = text.replace("—", "-").strip()
-    return text
+    if "http" not in text and "www." not in text:
+        # caso mais comum (headline sem URL): nem entra no motor de regex
+        return text.translate(_CLEAN_TRANS).strip()
+    return _URL_RE.sub("", text).translate(_CLEAN_TRANS).strip()
+
+
+def dedupe_headlines(items, threshold=0.85):
+    """Remove headlines quase iguais (a mesma notícia contada por várias fontes)."""
+    seen, unique = [], []
+    for item in items:
+        # títulos sem letras/dígitos ASCII (CJK, só emoji) ficavam com chave vazia e
+        # "iguais" entre si -> nesse caso compara o título em minúsculas tal como vem
+        key = _KEY_RE.sub("", item.title.lower())[:60] or item.title.lower()
+        if not any(difflib.SequenceMatcher(None, key, k).ratio() > threshold for k in seen):
+            seen.append(key)
+            unique.append(item)
+    return unique
 
 
 def timestamp():
@@ -38,6 +142,17 @@ def timestamp():
 
 # === 1) FETCH NEWS =======================================================================
 def fetch_news(limit=8):
+    # reaproveita as headlines de uma execução recente (ignora com FORCE_REFRESH=1)
+    cache_file = OUT / f".headlines_{limit}.json"
+    if (
+        not FORCE_REFRESH
+        and cache_file.exists()
+        and time.time() - cache_file.stat().st_mtime < NEWS_CACHE_TTL
+    ):
+        headlines = [Headline(**h) for h in orjson.loads(cache_file.read_bytes())]
+        print(f"♻️ {len(headlines)} notícias reaproveitadas da última execução.")
+        return headlines
+
     print("📰 A buscar notícias de crypto...")
     url = "https://cryptopanic.com/api/v1/posts/"
     params = {
@@ -47,72 +162,285 @@ def fetch_news(limit=8):
     }
     headlines = []
     try:
-        r = requests.get(url, params=params, timeout=20)
+        r = SESSION.get(url, params=params, timeout=20)
         r.raise_for_status()
-        data = r.json().get("results", [])
+        data = orjson.loads(r.content).get("results", [])
         for item in data[:limit]:
             title = clean_text(item.get("title", ""))
             source = (item.get("source") or {}).get("title", "")
-            if source:
-                headlines.append(f"{title} ({source})")
-            else:
-                headlines.append(title)
+            headlines.append(Headline(title, source))
         print(f"✅ {len(headlines)} notícias obtidas do CryptoPanic.")
     except Exception as e:
         print("⚠️ Falha no CryptoPanic, fallback Google News:", e)
+        # só usado neste fallback, carregado apenas quando preciso
+        import defusedxml.ElementTree as ET
+
         rss = "https://news.google.com/rss/search?q=cryptocurrency&hl=en&gl=US&ceid=US:en"
-        feed = feedparser.parse(rss)
-        for entry in feed.entries[:limit]:
-            headlines.append(clean_text(entry.title))
+        try:
+            resp = SESSION.get(rss, timeout=20)
+            resp.raise_for_status()
+            # lê o XML em streaming e pára logo que tem `limit` items
+            for _, el in ET.iterparse(io.BytesIO(resp.content), events=("end",)):
+                if el.tag == "item":
+                    headlines.append(Headline(clean_text(el.findtext("title") or "")))
+                    el.clear()
+                    if len(headlines) >= limit:
+                        break
+        except Exception as e:
+            print("⚠️ Falha no Google News:", e)
         print(f"✅ {len(headlines)} notícias obtidas via Google News fallback.")
+
+    if headlines:
+        cache_file.write_bytes(orjson.dumps([asdict(h) for h in headlines]))
     return headlines
 
 
 # === 2) AI CALL ==========================================================================
-def call_openai(prompt, max_tokens=1000, temperature=0.6):
-    """Faz uma chamada simples ao modelo de texto."""
-    if not OPENAI_API_KEY:
-        print("⚠️ Falta OPENAI_API_KEY, devolvo prompt.")
-        return f"[NO_AI_KEY]\n{prompt}"
+def _cache_key(body):
+    """SHA-256 dos campos do pedido que mudam a resposta (modelo, mensagens, params)."""
+    messages = [
+        {**m, "content": unicodedata.normalize("NFC", m["content"]).strip()}
+        for m in body["messages"]
+    ]
+    payload = {
+        "model": body["model"],
+        "messages": messages,
+        "temperature": body.get("temperature"),
+        "max_tokens": body.get("max_tokens"),
+        "response_format": body.get("response_format"),
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
-    headers = {
+
+def _cache_db():
+    db = sqlite3.connect(LLM_CACHE_PATH)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS llm_cache "
+        "(key TEXT PRIMARY KEY, response TEXT, created_at INTEGER)"
+    )
+    return db
+
+
+# cópia em memória das respostas já vistas nesta execução (evita ir ao SQLite outra vez)
+_MEMO = {}
+
+
+def _cache_get(key, ttl):
+    if key in _MEMO:
+        return _MEMO[key]
+    with closing(_cache_db()) as db:
+        row = db.execute(
+            "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+    if row and time.time() - row[1] < ttl:
+        _MEMO[key] = row[0]
+        return row[0]
+    return None
+
+
+def _cache_set(key, response):
+    _MEMO[key] = response
+    with closing(_cache_db()) as db, db:
+        db.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, response, created_at) VALUES (?, ?, ?)",
+            (key, response, int(time.time())),
+        )
+
+
+def _openai_headers():
+    return {
         "Authorization": f"Bearer {OPENAI_API_KEY}",
         "Content-Type": "application/json",
     }
-    body = {
-        "model": "gpt-4o-mini",
+
+
+class SemanticCache:
+    """Cache por semelhança: devolve a resposta de um prompt parecido (cosseno >= threshold).
+
+    Cada tarefa (summary, linkedin, ...) tem o seu namespace, para um resumo
+    nunca ser servido como tweets. Os embeddings da OpenAI vêm normalizados,
+    por isso o produto interno já é o cosseno.
+    """
+
+    def __init__(self, path, threshold=0.92):
+        self.path = path
+        self.threshold = threshold
+
+    def _db(self):
+        db = sqlite3.connect(self.path)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache "
+            "(namespace TEXT, prompt TEXT, embedding TEXT, response TEXT, created_at INTEGER)"
+        )
+        return db
+
+    def embed(self, text):
+        r = SESSION.post(
+            "https://api.openai.com/v1/embeddings",
+            headers=_openai_headers(),
+            data=orjson.dumps({"model": "text-embedding-3-small", "input": text}),
+            timeout=30,
+        )
+        r.raise_for_status()
+        return orjson.loads(r.content)["data"][0]["embedding"]
+
+    def lookup(self, namespace, embedding, ttl):
+        with closing(self._db()) as db:
+            rows = db.execute(
+                "SELECT embedding, response FROM semantic_cache "
+                "WHERE namespace = ? AND created_at >= ?",
+                (namespace, int(time.time() - ttl)),
+            ).fetchall()
+        best, best_score = None, self.threshold
+        for raw, response in rows:
+            score = sum(a * b for a, b in zip(embedding, json.loads(raw)))
+            if score >= best_score:
+                best, best_score = response, score
+        return best
+
+    def add(self, namespace, prompt, embedding, response):
+        with closing(self._db()) as db, db:
+            db.execute(
+                "INSERT INTO semantic_cache VALUES (?, ?, ?, ?, ?)",
+                (namespace, prompt, json.dumps(embedding), response, int(time.time())),
+            )
+
+
+SEMANTIC = SemanticCache(LLM_CACHE_PATH, SEMANTIC_THRESHOLD) if SEMANTIC_CACHE else None
+
+
+def _write_output(path, text):
+    """Escreve o ficheiro de uma vez em bytes, sem a camada TextIOWrapper do open()."""
+    path.write_bytes(text.encode("utf-8"))
+
+
+def _stream_chat(body, out_path):
+    """Pede a resposta em streaming (SSE) e escreve cada pedaço em out_path à medida que chega.
+
+    Escreve primeiro num .part ao lado e só o renomeia para out_path depois do [DONE],
+    para um stream cortado a meio nunca deixar um ficheiro truncado.
+    """
+    parts = []
+    part_path = out_path.with_suffix(out_path.suffix + ".part")
+    done = False
+    try:
+        with SESSION.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers=_openai_headers(),
+            data=orjson.dumps({**body, "stream": True}),
+            timeout=90,
+            stream=True,
+        ) as r:
+            r.raise_for_status()
+            with open(part_path, "w", encoding="utf-8") as f:
+                for line in r.iter_lines():
+                    if not line.startswith(b"data: "):
+                        continue
+                    data = line[len(b"data: "):]
+                    if data == b"[DONE]":
+                        done = True
+                        break
+                    choices = orjson.loads(data).get("choices") or []
+                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                    if delta:
+                        f.write(delta)
+                        parts.append(delta)
+        if not done:
+            raise IOError("stream terminou sem [DONE]")
+        part_path.replace(out_path)
+    finally:
+        part_path.unlink(missing_ok=True)
+    return "".join(parts)
+
+
+def cached_chat(body, ttl=LLM_CACHE_TTL, namespace=None, out_path=None, validate=None):
+    """Devolve a resposta guardada para este pedido exato; senão chama a OpenAI e guarda.
+
+    Com SEMANTIC_CACHE=1 e um namespace, tenta ainda um prompt parecido antes da chamada.
+    Com out_path, a resposta fica também escrita nesse ficheiro (em streaming se vier da API).
+    Com validate, uma resposta nova só vai para a cache se validate(resposta) não rebentar.
+    """
+    key = _cache_key(body)
+    cached = _cache_get(key, ttl)
+    if cached is not None:
+        print("♻️ Resposta em cache, sem chamada à OpenAI.")
+        if out_path:
+            _write_output(out_path, cached)
+        return cached
+
+    embedding = None
+    if SEMANTIC and namespace:
+        prompt = "\n".join(m["content"] for m in body["messages"])
+        try:
+            embedding = SEMANTIC.embed(prompt)
+            similar = SEMANTIC.lookup(namespace, embedding, ttl)
+        except Exception as e:
+            print("⚠️ Cache semântica indisponível:", e)
+            embedding, similar = None, None
+        if similar is not None:
+            print(f"♻️ Resposta semelhante em cache ({namespace}), sem chamada à OpenAI.")
+            if out_path:
+                _write_output(out_path, similar)
+            return similar
+
+    if out_path:
+        content = _stream_chat(body, out_path)
+    else:
+        r = SESSION.post(
+            "https://api.openai.com/v1/chat/completions",
+            headers=_openai_headers(),
+            data=orjson.dumps(body),
+            timeout=90,
+        )
+        r.raise_for_status()
+        content = orjson.loads(r.content)["choices"][0]["message"]["content"]
+    if validate:
+        validate(content)
+    _cache_set(key, content)
+    if embedding is not None:
+        SEMANTIC.add(namespace, prompt, embedding, content)
+    return content
+
+
+def _chat_body(prompt, max_tokens, temperature, model=OPENAI_MODEL):
+    return {
+        "model": model,
         "messages": [{"role": "user", "content": prompt}],
         "max_tokens": max_tokens,
         "temperature": temperature,
     }
-    r = requests.post(
-        "https://api.openai.com/v1/chat/completions",
-        headers=headers,
-        json=body,
-        timeout=90,
-    )
-    r.raise_for_status()
-    return r.json()["choices"][0]["message"]["content"]
+
+
+def call_openai(prompt, max_tokens=1000, temperature=0.6, model=OPENAI_MODEL,
+                namespace=None, out_path=None):
+    """Faz uma chamada simples ao modelo de texto (e escreve-a em out_path, se dado)."""
+    if not OPENAI_API_KEY:
+        print("⚠️ Falta OPENAI_API_KEY, devolvo prompt.")
+        text = f"[NO_AI_KEY]\n{prompt}"
+        if out_path:
+            _write_output(out_path, text)
+        return text
+
+    body = _chat_body(prompt, max_tokens, temperature, model)
+    return cached_chat(body, namespace=namespace, out_path=out_path)
 
 
 # === 3) CONTENT GENERATORS ===============================================================
-def build_summary(news_items):
-    print("📌 A gerar summary bullets...")
-    prompt = f"""
+def summary_prompt(news_blob):
+    return f"""
 Summarize today's cryptocurrency landscape in 8 concise bullet points.
 Each bullet: start with a short bold-style title (like **ETF Surge:**) and then 1 sentence.
 Keep it neutral, informative, English.
 Base it ONLY on these headlines:
-{chr(10).join(news_items)}
+{news_blob}
 """
-    return call_openai(prompt, max_tokens=1000, temperature=0.5)
 
 
-def build_linkedin(news_items):
-    print("💼 A gerar LinkedIn post...")
-    prompt = f"""
+def linkedin_prompt(news_blob):
+    return f"""
 Write a professional English LinkedIn-style crypto analysis post based on these headlines:
-{chr(10).join(news_items)}
+{news_blob}
 
 Format:
 1. Strong intro (market mood / why today matters).
@@ -121,12 +449,10 @@ Format:
 
 Tone: calm, informed, credible. No emojis.
 """
-    return call_openai(prompt, max_tokens=1000, temperature=0.6)
 
 
-def build_substack(news_items):
-    print("📰 A gerar Substack newsletter...")
-    prompt = f"""
+def substack_prompt(news_blob):
+    return f"""
 Write a conversational daily crypto newsletter in English.
 Audience: curious investors who don't have time.
 Style:
@@ -136,14 +462,12 @@ Style:
 
 Use short paragraphs. No emojis.
 Base ONLY on:
-{chr(10).join(news_items)}
+{news_blob}
 """
-    return call_openai(prompt, max_tokens=1000, temperature=0.7)
 
 
-def build_youtube_script(news_items):
-    print("🎬 A gerar guião YouTube Shorts...")
-    prompt = f"""
+def youtube_prompt(news_blob_top3):
+    return f"""
 Write a 60-second YouTube Shorts script in English.
 Goal: fast, hype, but still factual.
 Rules:
@@ -153,55 +477,308 @@ Rules:
 
 Keep sentences short, like spoken voice.
 Base ONLY on:
-{chr(10).join(news_items[:3])}
+{news_blob_top3}
 """
-    return call_openai(prompt, max_tokens=700, temperature=0.7)
 
 
-def build_tweets(news_items):
-    print("🐦 A gerar tweets...")
-    prompt = f"""
+def tweets_prompt(news_blob):
+    return f"""
 For EACH headline below, write one tweet in English (max 250 characters).
 No links, no hashtags, no emojis.
 Tweets should sound confident and analytical, not hype.
 Return them as a numbered list (1., 2., 3., ...).
 
 Headlines:
-{chr(10).join(news_items)}
+{news_blob}
 """
-    return call_openai(prompt, max_tokens=800, temperature=0.6)
 
 
-# === 4) BLUESKY POSTING ==================================================================
-def post_to_bluesky(text):
-    """Publica um post básico no Bluesky (ou simula se DRY_RUN=1)."""
-    clean = text.strip()
-    clean = clean_text(clean)
-    clean = clean[:280]  # garantes limite
+# formato -> (prompt, max_tokens, temperature, modelo)
+# Tweets e shorts são curtos e formatados: um modelo mais pequeno chega e responde mais depressa.
+CONTENT_SPECS = {
+    "summary":  (summary_prompt, 1000, 0.5, OPENAI_MODEL),
+    "linkedin": (linkedin_prompt, 1000, 0.6, OPENAI_MODEL),
+    "substack": (substack_prompt, 1000, 0.7, OPENAI_MODEL),
+    "shorts":   (youtube_prompt, 700, 0.7, OPENAI_FAST_MODEL),
+    "tweets":   (tweets_prompt, 800, 0.6, OPENAI_FAST_MODEL),
+}
+
+
+def generate(kind, news_blob, out_path=None):
+    """Gera um dos formatos de CONTENT_SPECS."""
+    prompt_fn, max_tokens, temperature, model = CONTENT_SPECS[kind]
+    return call_openai(
+        prompt_fn(news_blob),
+        max_tokens=max_tokens,
+        temperature=temperature,
+        model=model,
+        namespace=kind,
+        out_path=out_path,
+    )
 
-    if DRY_RUN:
-        print("🚫 DRY_RUN ativo — simulação de Bluesky:", clean[:120], "...")
-        return
 
-    print("🌐 A publicar no Bluesky...")
+def build_summary(news_blob, out_path=None):
+    print("📌 A gerar summary bullets...")
+    return generate("summary", news_blob, out_path)
+
+
+def build_linkedin(news_blob, out_path=None):
+    print("💼 A gerar LinkedIn post...")
+    return generate("linkedin", news_blob, out_path)
+
+
+def build_substack(news_blob, out_path=None):
+    print("📰 A gerar Substack newsletter...")
+    return generate("substack", news_blob, out_path)
+
+
+def build_youtube_script(news_blob_top3, out_path=None):
+    print("🎬 A gerar guião YouTube Shorts...")
+    return generate("shorts", news_blob_top3, out_path)
+
+
+def build_tweets(news_blob, out_path=None):
+    print("🐦 A gerar tweets...")
+    return generate("tweets", news_blob, out_path)
+
+
+BUILDERS = {
+    "summary":  build_summary,
+    "linkedin": build_linkedin,
+    "substack": build_substack,
+    "shorts":   build_youtube_script,
+    "tweets":   build_tweets,
+}
+
+# formato -> (sufixo do ficheiro, descrição)
+OUTPUT_FILES = {
+    "summary":  ("summary.md", "resumo bullets"),
+    "linkedin": ("linkedin.txt", "LinkedIn pro"),
+    "substack": ("substack.txt", "Substack newsletter"),
+    "shorts":   ("shorts.txt", "YouTube Shorts script"),
+    "tweets":   ("tweets.txt", "tweets para X"),
+}
+
+
+def _parse_all(content):
+    """JSON da chamada combinada -> {formato: texto}; rebenta se faltar algum formato."""
+    out = orjson.loads(content)
+    return {
+        kind: "\n".join(map(str, out[kind])) if isinstance(out[kind], list) else str(out[kind])
+        for kind in CONTENT_SPECS
+    }
+
+
+def build_all(news_blob):
+    """Gera os 5 formatos numa só chamada JSON (headlines enviadas uma vez).
+
+    Devolve {formato: texto} com as chaves de CONTENT_SPECS, ou None se a resposta
+    não servir (o main() volta então às 5 chamadas separadas).
+    """
+    if not OPENAI_API_KEY:
+        return None
+
+    print("🧩 A gerar os 5 formatos numa só chamada...")
+    prompt = f"""
+Based ONLY on these crypto headlines:
+{news_blob}
+
+Write five pieces of content in English:
+- summary: today's landscape in 8 concise bullet points, each starting with a short bold-style title (like **ETF Surge:**) and then 1 sentence. Neutral, informative.
+- linkedin: professional analysis post. Strong intro, 3-4 short flowing paragraphs tying events together, closing inviting discussion. Calm, credible, no emojis.
+- substack: conversational daily newsletter for busy investors. Warm "Good morning..." intro, 3-4 key stories in plain language, last line a forward-looking teaser. Short paragraphs, no emojis.
+- shorts: 60-second Shorts script on the 3 biggest stories. Hook in the first 2 seconds, 1-2 punchy sentences per story, end with "Follow for daily crypto in 60 seconds."
+- tweets: one tweet per headline (max 250 characters), no links, hashtags or emojis, confident and analytical, as a numbered list (1., 2., 3., ...).
+
+Respond ONLY as JSON with keys: {", ".join(CONTENT_SPECS)}. Every value is a single string.
+"""
+    body = {
+        "model": OPENAI_MODEL,
+        "response_format": {"type": "json_object"},
+        "messages": [
+            {"role": "system", "content": "You are a multi-format crypto content generator."},
+            {"role": "user", "content": prompt},
+        ],
+        "max_tokens": 3500,
+    }
     try:
-        # login
-        session = requests.post(
-            "https://bsky.social/xrpc/com.atproto.server.createSession",
-            json={"identifier": BLUESKY_HANDLE, "password": BLUESKY_PASSWORD},
-            timeout=20,
-        )
-        session.raise_for_status()
-        access_token = session.json().get("accessJwt")
-        if not access_token:
-            print("❌ Falha no login Bluesky.")
-            return
+        # valida antes de guardar: uma resposta partida não fica presa na cache
+        return _parse_all(cached_chat(body, namespace="all", validate=_parse_all))
+    except (ValueError, KeyError, TypeError) as e:
+        print("⚠️ Resposta combinada inválida, volto às chamadas separadas:", e)
+        return None
+
+
+# === 4) BATCH API ========================================================================
+def _batch_input(blobs):
+    """Um pedido /v1/chat/completions por formato, em JSONL, identificado pelo custom_id.
+
+    blobs: {formato: bloco de headlines desse prompt}, montado uma vez no main().
+    """
+    lines = []
+    for kind, (prompt_fn, max_tokens, temperature, model) in CONTENT_SPECS.items():
+        lines.append(orjson.dumps({
+            "custom_id": kind,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": _chat_body(prompt_fn(blobs[kind]), max_tokens, temperature, model),
+        }))
+    return b"\n".join(lines)
+
+
+def submit_batch(blobs, news_hash):
+    """Envia os 5 pedidos para a Batch API e guarda "id hash-das-headlines" em BATCH_STATE_PATH."""
+    upload = SESSION.post(
+        "https://api.openai.com/v1/files",
+        headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
+        data={"purpose": "batch"},
+        files={"file": ("batch.jsonl", _batch_input(blobs))},
+        timeout=60,
+    )
+    upload.raise_for_status()
+
+    batch = SESSION.post(
+        "https://api.openai.com/v1/batches",
+        headers=_openai_headers(),
+        data=orjson.dumps({
+            "input_file_id": orjson.loads(upload.content)["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h",
+        }),
+        timeout=60,
+    )
+    batch.raise_for_status()
+    batch_id = orjson.loads(batch.content)["id"]
+    BATCH_STATE_PATH.write_text(f"{batch_id} {news_hash}", encoding="utf-8")
+    return batch_id
+
+
+def collect_batch(batch_id):
+    """Devolve {formato: texto} se o batch terminou, ou None se ainda está a correr.
+
+    Um batch que acabou sem resultados (failed/expired/cancelled) devolve {}.
+    Erros de rede ou da API ao consultar o estado sobem como exceção.
+    """
+    r = SESSION.get(
+        f"https://api.openai.com/v1/batches/{batch_id}",
+        headers=_openai_headers(),
+        timeout=30,
+    )
+    r.raise_for_status()
+    batch = orjson.loads(r.content)
+    if batch["status"] in ("validating", "in_progress", "finalizing"):
+        return None
+    if batch["status"] != "completed" or not batch.get("output_file_id"):
+        print(f"⚠️ Batch {batch_id} terminou com estado {batch['status']}, sem resultados.")
+        return {}
+
+    r = SESSION.get(
+        f"https://api.openai.com/v1/files/{batch['output_file_id']}/content",
+        headers=_openai_headers(),
+        timeout=60,
+    )
+    r.raise_for_status()
+    results = {}
+    for line in r.text.splitlines():
+        if not line.strip():
+            continue
+        item = orjson.loads(line)
+        body = (item.get("response") or {}).get("body") or {}
+        if body.get("choices"):
+            results[item["custom_id"]] = body["choices"][0]["message"]["content"]
+    return results
+
+
+def run_batch(blobs, news_hash):
+    """BATCH_MODE=1: ~50% mais barato, mas a resposta chega até 24h depois.
+
+    Se há um batch pendente ainda em curso (ou não deu para ver o estado), não faz
+    mais nada. Se terminou, recolhe os textos e, na mesma execução, submete logo o
+    batch das headlines de hoje (a não ser que sejam as mesmas). Devolve
+    ({formato: texto}, hash das headlines a que esses textos correspondem) —
+    ({}, None) se não há nada novo.
+    """
+    results, results_hash = {}, None
+    if BATCH_STATE_PATH.exists():
+        batch_id, _, results_hash = BATCH_STATE_PATH.read_text(encoding="utf-8").strip().partition(" ")
+        try:
+            collected = collect_batch(batch_id)
+        except Exception as e:
+            # falha temporária a consultar: o batch pode estar bem, fica para a próxima
+            print(f"⚠️ Não consegui ver o estado do batch {batch_id}, tento na próxima execução:", e)
+            return {}, None
+        if collected is None:
+            print(f"⏳ Batch {batch_id} ainda em curso — tenta na próxima execução.")
+            return {}, None
+        if collected:
+            print(f"✅ Batch {batch_id} concluído.")
+            results = collected
+
+    if results_hash != news_hash or set(results) != set(CONTENT_SPECS):
+        print("📦 A submeter batch à OpenAI...")
+        try:
+            batch_id = submit_batch(blobs, news_hash)  # substitui o estado do batch recolhido
+            print(f"📦 Batch {batch_id} submetido — os ficheiros saem numa próxima execução.")
+        except Exception as e:
+            # os textos já recolhidos (e pagos) saem na mesma
+            print("⚠️ Falha a submeter o batch:", e)
+            BATCH_STATE_PATH.unlink(missing_ok=True)
+    else:
+        BATCH_STATE_PATH.unlink(missing_ok=True)
+    return results, (results_hash or None) if results else None
+
+
+# === 5) BLUESKY POSTING ==================================================================
+# accessJwt da sessão Bluesky aberta nesta execução e quando expira (epoch)
+_BSKY_TOKEN = None
+_BSKY_EXPIRES = 0.0
+
+
+def _jwt_expiry(token):
+    """Lê o claim exp de um JWT, sem verificar a assinatura (só para saber quando expira)."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(orjson.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return time.time() + 600  # sem exp legível: assume uns minutos de validade
+
+
+def bluesky_login():
+    """Devolve um accessJwt válido, reaproveitando o anterior enquanto não expira (ou None se falhar)."""
+    global _BSKY_TOKEN, _BSKY_EXPIRES
+    if _BSKY_TOKEN and time.time() < _BSKY_EXPIRES - 60:
+        return _BSKY_TOKEN
+
+    session = SESSION.post(
+        "https://bsky.social/xrpc/com.atproto.server.createSession",
+        headers={"Content-Type": "application/json"},
+        data=orjson.dumps({"identifier": BLUESKY_HANDLE, "password": BLUESKY_PASSWORD}),
+        timeout=20,
+    )
+    session.raise_for_status()
+    token = orjson.loads(session.content).get("accessJwt")
+    if token:
+        _BSKY_TOKEN, _BSKY_EXPIRES = token, _jwt_expiry(token)
+    return token
 
-        headers = {"Authorization": f"Bearer {access_token}"}
+
+def post_to_bluesky(text, access_token):
+    """Publica um post básico no Bluesky com uma sessão já aberta.
+
+    O texto já vem limpo do fetch_news (clean_text), aqui só se corta ao limite.
+    """
+    clean = text.strip()[:280]  # garantes limite
+
+    try:
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+        }
         record = {
             "$type": "app.bsky.feed.post",
             "text": clean,
-            "createdAt": datetime.now(timezone.utc).isoformat(),
+            "createdAt": datetime.now(timezone.utc),  # orjson serializa em RFC 3339
         }
         data = {
             "collection": "app.bsky.feed.post",
@@ -209,74 +786,163 @@ def post_to_bluesky(text):
             "record": record,
         }
 
-        post = requests.post(
+        post = SESSION.post(
             "https://bsky.social/xrpc/com.atproto.repo.createRecord",
             headers=headers,
-            json=data,
+            data=orjson.dumps(data),
             timeout=20,
         )
         post.raise_for_status()
         print("✅ Publicado no Bluesky!")
+        return True
+    except Exception as e:
+        print("⚠️ Erro ao publicar no Bluesky:", e)
+        return False
+
+
+def _post_key(text):
+    return hashlib.sha256(text.strip()[:280].encode("utf-8")).hexdigest()[:16]
+
+
+def publish_to_bluesky(texts):
+    """Faz login uma vez e publica todos os posts em paralelo (ou simula se DRY_RUN=1).
+
+    Os posts já publicados numa execução anterior ficam de fora, mesmo que a geração
+    dos textos tenha de ser repetida — assim o Bluesky nunca leva o mesmo post duas vezes.
+    """
+    posted = BLUESKY_POSTED_PATH.read_text(encoding="utf-8").split() if BLUESKY_POSTED_PATH.exists() else []
+    texts = [text for text in texts if _post_key(text) not in posted]
+    if not texts:
+        print("⏭️ Estes posts já foram publicados no Bluesky.")
+        return
+
+    if DRY_RUN:
+        for text in texts:
+            print("🚫 DRY_RUN ativo — simulação de Bluesky:", text.strip()[:120], "...")
+        return
+
+    print("🌐 A publicar no Bluesky...")
+    try:
+        access_token = bluesky_login()
     except Exception as e:
         print("⚠️ Erro ao publicar no Bluesky:", e)
+        return
+    if not access_token:
+        print("❌ Falha no login Bluesky.")
+        return
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        ok = list(pool.map(post_to_bluesky, texts, [access_token] * len(texts)))
+    posted += [_post_key(text) for text, sent in zip(texts, ok) if sent]
+    BLUESKY_POSTED_PATH.write_text("\n".join(posted[-100:]), encoding="utf-8")
+
+
+# === 6) MAIN =============================================================================
+def _already_done(news_hash):
+    """Devolve o stamp da última execução com estas mesmas headlines, se os ficheiros ainda existem."""
+    if not LAST_HEADLINES_PATH.exists():
+        return None
+    last_hash, _, stamp = LAST_HEADLINES_PATH.read_text(encoding="utf-8").partition(" ")
+    if last_hash != news_hash:
+        return None
+    if all((OUT / f"{stamp}_{suffix}").exists() for suffix, _ in OUTPUT_FILES.values()):
+        return stamp
+    return None
 
 
-# === 5) MAIN =============================================================================
 def main():
     print("\n=== CryptoPulse.AI — Run", datetime.now(timezone.utc), "===\n")
 
     # 1. Buscar notícias
-    news = fetch_news(10)
+    news = dedupe_headlines(fetch_news(10))
     if not news:
         print("❌ Nenhuma notícia encontrada.")
         return
 
-    # 2. Gerar conteúdo
-    summary_md   = build_summary(news)
-    linkedin_txt = build_linkedin(news)
-    substack_txt = build_substack(news)
-    shorts_txt   = build_youtube_script(news)
-    tweets_txt   = build_tweets(news)
+    # bloco de headlines montado uma só vez e partilhado por todos os prompts
+    news_blob = format_headlines(news)
+    news_blob_top3 = format_headlines(news[:3])  # os Shorts só falam das 3 maiores
+    blobs = {kind: news_blob_top3 if kind == "shorts" else news_blob for kind in CONTENT_SPECS}
+    news_hash = hashlib.sha256(news_blob.encode("utf-8")).hexdigest()[:16]
+    # o feed não rodou desde a última execução -> não gera nem publica outra vez
+    last_stamp = None if FORCE_REFRESH else _already_done(news_hash)
+    if last_stamp:
+        print(f"⏭️ Sem headlines novas desde {last_stamp} — nada a fazer.")
+        return
 
-    # 3. Timestamp para ficheiros
+    # 2. Timestamp para ficheiros
     stamp = timestamp()
 
-    summary_path   = os.path.join(OUT_DIR, f"{stamp}_summary.md")
-    linkedin_path  = os.path.join(OUT_DIR, f"{stamp}_linkedin.txt")
-    substack_path  = os.path.join(OUT_DIR, f"{stamp}_substack.txt")
-    shorts_path    = os.path.join(OUT_DIR, f"{stamp}_shorts.txt")
-    tweets_path    = os.path.join(OUT_DIR, f"{stamp}_tweets.txt")
-
-    # 4. Guardar localmente (no runner da cloud OU no teu PC se correres local)
-    with open(summary_path, "w", encoding="utf-8") as f:
-        f.write(summary_md)
-
-    with open(linkedin_path, "w", encoding="utf-8") as f:
-        f.write(linkedin_txt)
-
-    with open(substack_path, "w", encoding="utf-8") as f:
-        f.write(substack_txt)
-
-    with open(shorts_path, "w", encoding="utf-8") as f:
-        f.write(shorts_txt)
+    paths = {
+        kind: OUT / f"{stamp}_{suffix}"
+        for kind, (suffix, _) in OUTPUT_FILES.items()
+    }
 
-    with open(tweets_path, "w", encoding="utf-8") as f:
-        f.write(tweets_txt)
+    # 3. Gerar conteúdo (no runner da cloud OU no teu PC se correres local)
+    failed = False  # algum formato ou ficheiro falhou -> a execução termina com erro
+    fresh = True    # os textos gerados são destas headlines
+    if BATCH_MODE and OPENAI_API_KEY:
+        generated, generated_hash = run_batch(blobs, news_hash)
+        # textos de um batch anterior são de outras headlines: não contam como feitos para estas
+        fresh = generated_hash == news_hash
+        # nem textos destas headlines nem batch pendente -> a submissão falhou
+        failed = not fresh and not BATCH_STATE_PATH.exists()
+    else:
+        generated = build_all(news_blob) if COMBINED_PROMPT else None
+        if not generated:
+            generated = {}
+            # as 5 chamadas são independentes -> correm em paralelo,
+            # e cada uma vai escrevendo o seu ficheiro à medida que o texto chega
+            with ThreadPoolExecutor(max_workers=5) as pool:
+                jobs = {
+                    kind: pool.submit(build, blobs[kind], paths[kind])
+                    for kind, build in BUILDERS.items()
+                }
+            # um formato que falhe não deita fora os outros nem os posts do Bluesky
+            for kind, job in jobs.items():
+                try:
+                    job.result()
+                except Exception as e:
+                    failed = True
+                    print(f"⚠️ Falha a gerar {kind}:", e)
+
+    with ThreadPoolExecutor(max_workers=5) as writer:
+        # 4. Guardar localmente o que veio inteiro (batch / chamada combinada),
+        # em segundo plano enquanto se publica no Bluesky
+        writes = {
+            kind: writer.submit(_write_output, paths[kind], text)
+            for kind, text in generated.items()
+        }
 
-    # 5. Bluesky (publica só os títulos, sem links)
-    print("\n🌐 A publicar posts no Bluesky...")
-    for headline in news[:5]:
-        # headline vem tipo "Bitcoin pumps after ETF approval (CoinDesk)"
-        # queremos só a parte antes do '('
-        title_only = headline.split("(")[0].strip()
-        post_to_bluesky(title_only)
+        # 5. Bluesky (publica só os títulos, sem links)
+        print("\n🌐 A publicar posts no Bluesky...")
+        publish_to_bluesky([headline.title for headline in news[:5]])
+
+    for kind, write in writes.items():
+        if write.exception():
+            failed = True
+            print(f"⚠️ Falha a guardar {kind}:", write.exception())
+
+    # só marca estas headlines como tratadas se os 5 formatos saíram mesmo da OpenAI
+    # e os posts foram publicados a sério (não em DRY_RUN nem sem chave)
+    if (
+        not failed
+        and fresh
+        and not DRY_RUN
+        and OPENAI_API_KEY
+        and all(path.exists() for path in paths.values())
+    ):
+        LAST_HEADLINES_PATH.write_text(f"{news_hash} {stamp}", encoding="utf-8")
 
     print("\n💾 Ficheiros gerados:")
-    print("•", summary_path,   "— resumo bullets")
-    print("•", linkedin_path,  "— LinkedIn pro")
-    print("•", substack_path,  "— Substack newsletter")
-    print("•", shorts_path,    "— YouTube Shorts script")
-    print("•", tweets_path,    "— tweets para X")
+    for kind, path in paths.items():
+        if path.exists():
+            print("•", path, "—", OUTPUT_FILES[kind][1])
+
+    # os outros formatos e os posts já saíram, mas a execução tem de ficar vermelha no CI
+    if failed:
+        print("\n❌ Houve formatos que falharam — ver os avisos acima.")
+        sys.exit(1)
 
     if DRY_RUN:
         print("\n🚫 DRY_RUN ativo — Nenhum post real foi publicado.")
@@ -285,4 +951,8 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # fecha as ligações keep-alive que ficaram no pool
+        SESSION.close()